@@ -1,6 +1,8 @@
 import logging
 
+import httpx
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
 
 from livekit.agents import (
     Agent,
@@ -16,13 +18,70 @@ from livekit.agents import (
 )
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import MetricsCollectedEvent
-from livekit.plugins import deepgram, openai, silero, turn_detector, elevenlabs
+from livekit.plugins import deepgram, openai, turn_detector, elevenlabs
 from livekit.plugins import noise_cancellation
+from src.vad import load_vad
 import os
 
 logger = logging.getLogger("basic-agent")
 
-load_dotenv(dotenv_path=".env")
+# parse .env once per process; prewarmed/forked children inherit os.environ
+if not os.environ.get("_DOTENV_LOADED"):
+    load_dotenv(dotenv_path=".env")
+    os.environ["_DOTENV_LOADED"] = "1"
+
+# resolved once at import so session starts don't re-query the environment
+ELEVEN_VOICE_ID = os.getenv("ELEVEN_VOICE_ID")
+
+# set REALTIME_MODEL=1 to collapse the Deepgram/OpenAI/ElevenLabs triple hop
+# into a single speech-to-speech model (one network leg per turn)
+USE_REALTIME = os.getenv("REALTIME_MODEL", "").lower() in ("1", "true")
+
+# one LLM per process: a persistent HTTP/2 connection is reused across turns
+# instead of paying a fresh pool and TLS handshake per job
+SHARED_LLM = openai.LLM(
+    model="gpt-4o-mini",
+    temperature=0.4,
+    parallel_tool_calls=False,
+    client=AsyncOpenAI(
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    ),
+)
+
+# built once at import; every job reuses the validated pydantic models
+# instead of reconstructing them in the entrypoint
+CAROLINA_VOICE = elevenlabs.tts.Voice(
+    id=ELEVEN_VOICE_ID,
+    name="Carolina",
+    category="premade",
+    settings=elevenlabs.tts.VoiceSettings(
+        stability=0.71,
+        similarity_boost=0.5,
+        style=0.0,
+        use_speaker_boost=True,
+    ),
+)
+
+
+def _make_tts():
+    # TTS_BACKEND=local_int8 targets a locally served int8-quantized model
+    # behind the OpenAI speech API, trading ElevenLabs quality for zero WAN
+    # latency on the synthesis leg
+    if os.getenv("TTS_BACKEND") == "local_int8":
+        return openai.TTS(
+            model=os.getenv("LOCAL_TTS_MODEL", "tts-1"),
+            voice=os.getenv("LOCAL_TTS_VOICE", "alloy"),
+            base_url=os.getenv("LOCAL_TTS_URL", "http://localhost:8880/v1"),
+        )
+    return elevenlabs.TTS(
+        voice=CAROLINA_VOICE,
+        # start synthesis at 50 chars (the API minimum) instead of the
+        # default 80, so the first audio chunk ships earlier in the turn
+        chunk_length_schedule=[50, 120, 200, 260],
+    )
 
 
 class AgenteValley(Agent):
@@ -59,7 +118,7 @@ class AgenteValley(Agent):
             longitude: The longitude of the location
         """
 
-        logger.info(f"Looking up weather for {location}")
+        logger.info("Looking up weather for %s", location)
 
         return {
             "weather": "sunny",
@@ -68,33 +127,61 @@ class AgenteValley(Agent):
         }
 
 
-def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+def _noise_filter():
+    # NOISE_CANCELLATION=bvc|nc|off — BVC runs on every inbound frame and is
+    # pure CPU overhead on clean headset audio, where the lighter NC model
+    # (or none at all) frees cycles for STT streaming
+    mode = os.getenv("NOISE_CANCELLATION", "bvc").lower()
+    if mode == "off":
+        return None
+    if mode == "nc":
+        return noise_cancellation.NC()
+    return noise_cancellation.BVC()
 
 
-async def entrypoint(ctx: JobContext):
-    await ctx.connect()
+def prewarm(proc: JobProcess):
+    proc.userdata["vad"] = load_vad()
+    if not USE_REALTIME:
+        # the EOU model is invoked every turn; load it once per worker
+        # instead of per job (the realtime path detects turns server-side)
+        proc.userdata["eou"] = turn_detector.EOUModel()
+
 
-    session = AgentSession(
+def _pipeline_session(ctx: JobContext) -> AgentSession:
+    return AgentSession(
         vad=ctx.proc.userdata["vad"],
         # any combination of STT, LLM, TTS, or realtime API can be used
-        llm=openai.LLM(model="gpt-4o-mini", temperature=0.4),
-        stt=deepgram.STT(model="nova-3-general", language="es"),
-        tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-                id=os.getenv("ELEVEN_VOICE_ID"),
-                name="Carolina",
-                category="premade",
-                settings=elevenlabs.tts.VoiceSettings(
-                    stability=0.71,
-                    similarity_boost=0.5,
-                    style=0.0,
-                    use_speaker_boost=True
-                )
-        )),
-        # use LiveKit's turn detection model
-        turn_detection=turn_detector.EOUModel(),
+        llm=SHARED_LLM,
+        stt=deepgram.STT(
+            model="nova-3-general",
+            language="es",
+            # skip server-side formatting passes; punctuation (on by
+            # default) is enough for the LLM
+            smart_format=False,
+        ),
+        tts=_make_tts(),
+        # use LiveKit's turn detection model, loaded once in prewarm
+        turn_detection=ctx.proc.userdata["eou"],
+        # start the LLM on partial transcripts so the first TTS chunk ships
+        # before the turn detector finalizes
+        preemptive_generation=True,
     )
 
+
+async def entrypoint(ctx: JobContext):
+    await ctx.connect()
+
+    if USE_REALTIME:
+        # the realtime API does VAD and turn detection server-side and keeps
+        # function_tool definitions; LiveKit stays as the transport
+        session = AgentSession(
+            llm=openai.realtime.RealtimeModel(
+                voice="alloy", model="gpt-4o-realtime-preview"
+            ),
+        )
+    else:
+        session = _pipeline_session(ctx)
+
     # log metrics as they are emitted, and total usage after session is over
     usage_collector = metrics.UsageCollector()
 
@@ -105,7 +192,7 @@ async def entrypoint(ctx: JobContext):
 
     async def log_usage():
         summary = usage_collector.get_summary()
-        logger.info(f"Usage: {summary}")
+        logger.info("Usage: %s", summary)
 
     # shutdown callbacks are triggered when the session is over
     ctx.add_shutdown_callback(log_usage)
@@ -117,7 +204,7 @@ async def entrypoint(ctx: JobContext):
         agent=AgenteValley(),
         room=ctx.room,
         room_input_options=RoomInputOptions(
-        noise_cancellation=noise_cancellation.BVC(),
+        noise_cancellation=_noise_filter(),
         ),
         room_output_options=RoomOutputOptions(transcription_enabled=True),
     )
@@ -1,26 +1,102 @@
+import functools
 import logging
 
+from collections import deque
 from typing import Annotated
 
+import httpx
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
 from pydantic import Field
 from src.models import UserData
+from src.vad import load_vad
 
-from livekit.agents import JobContext, WorkerOptions, cli, llm
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli, llm
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.agents.voice.room_io import RoomInputOptions
-from livekit.plugins import deepgram, openai, silero, elevenlabs, turn_detector, noise_cancellation
 import os
 
+# the livekit plugins are imported lazily inside the factories below: pulling
+# them in at module import loads torch weights and HTTP clients in the parent
+# worker before a job even arrives, inflating the RSS every forked child
+# starts from
+
 logger = logging.getLogger("restaurant-magalia")
 logger.setLevel(logging.INFO)
 
-load_dotenv(dotenv_path=".env")
+# parse .env once per process; prewarmed/forked children inherit os.environ
+if not os.environ.get("_DOTENV_LOADED"):
+    load_dotenv(dotenv_path=".env")
+    os.environ["_DOTENV_LOADED"] = "1"
+
+# resolved once at import; the value never changes during a run
+_ELEVEN_VOICE_ID = os.getenv("ELEVEN_VOICE_ID")
+if not _ELEVEN_VOICE_ID:
+    logger.warning("ELEVEN_VOICE_ID is not set; ElevenLabs TTS will fail to start")
 
 RunContext_T = RunContext[UserData]
 
 
+@functools.cache
+def _llm():
+    # one LLM per process shared by the session and every sub-agent: a single
+    # httpx pool keeps the HTTP/2 connection warm across tool-call round-trips
+    from livekit.plugins import openai
+
+    return openai.LLM(
+        model="gpt-4o-mini",
+        parallel_tool_calls=False,
+        client=AsyncOpenAI(
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32),
+            )
+        ),
+    )
+
+
+@functools.cache
+def _voice():
+    # the Carolina voice and its settings are immutable for the whole run;
+    # cached instead of a module constant so elevenlabs stays lazily imported
+    from livekit.plugins import elevenlabs
+
+    return elevenlabs.tts.Voice(
+        id=_ELEVEN_VOICE_ID,
+        name="Carolina",
+        category="premade",
+        settings=elevenlabs.tts.VoiceSettings(
+            stability=0.71,
+            similarity_boost=0.5,
+            style=0.0,
+            use_speaker_boost=True,
+        ),
+    )
+
+
+@functools.cache
+def _make_tts():
+    # one TTS per process: the session and all four sub-agents previously
+    # each held their own client, duplicating HTTP pools and buffers 5x per
+    # room. TTS_BACKEND=local_int8 targets a locally served int8-quantized
+    # model behind the OpenAI speech API instead of the remote ElevenLabs hop
+    from livekit.plugins import elevenlabs, openai
+
+    if os.getenv("TTS_BACKEND") == "local_int8":
+        return openai.TTS(
+            model=os.getenv("LOCAL_TTS_MODEL", "tts-1"),
+            voice=os.getenv("LOCAL_TTS_VOICE", "alloy"),
+            base_url=os.getenv("LOCAL_TTS_URL", "http://localhost:8880/v1"),
+        )
+    return elevenlabs.TTS(
+        voice=_voice(),
+        # start synthesis at 50 chars (the API minimum) instead of the
+        # default 80, so the first audio chunk ships earlier in the turn
+        chunk_length_schedule=[50, 120, 200, 260],
+    )
+
+
 # common functions
 
 
@@ -33,6 +109,7 @@ async def update_name(
     Confirm the spelling with the user before calling the function."""
     userdata = context.userdata
     userdata.customer_name = name
+    userdata.touch()
     return f"The name is updated to {name}"
 
 
@@ -45,6 +122,7 @@ async def update_phone(
     Confirm the spelling with the user before calling the function."""
     userdata = context.userdata
     userdata.customer_phone = phone
+    userdata.touch()
     return f"The phone number is updated to {phone}"
 
 
@@ -56,29 +134,110 @@ async def to_greeter(context: RunContext_T) -> Agent:
     return await curr_agent._transfer_to_agent("greeter", context)
 
 
+# built once at import: function_tool already derives each tool's JSON schema
+# at decoration time, so sharing the table means agent construction does no
+# per-instance schema work
+_CONTACT_TOOLS = [update_name, update_phone, to_greeter]
+
+
+# shared by the truncation hot path: no per-item list literal, O(1) membership
+_FC_TYPES = frozenset({"function_call", "function_call_output"})
+
+# one precompiled predicate per (keep_system_message, keep_function_call)
+# combination, so the per-item check carries no branching on flags that are
+# constant for the whole call
+_VALID_ITEM = {
+    (False, False): lambda item: item.type not in _FC_TYPES
+    and not (item.type == "message" and item.role == "system"),
+    (False, True): lambda item: not (item.type == "message" and item.role == "system"),
+    (True, False): lambda item: item.type not in _FC_TYPES,
+    (True, True): lambda item: True,
+}
+
+
+def _is_volatile_system_message(item: llm.ChatItem) -> bool:
+    """Match the per-turn user-data blocks (and the legacy combined
+    agent+data prompt), but not the stable identity message."""
+    if item.type != "message" or item.role != "system":
+        return False
+    text = item.text_content or ""
+    return text.startswith("Datos:") or (
+        text.startswith("Eres el agente") and "Los datos" in text
+    )
+
+
+def _apply_prompt_blocks(chat_ctx, agent_name: str, summary: str, existing_ids: set[str]) -> None:
+    """Pin the stable identity block at the top of the context and keep a
+    single up-to-date 'Datos:' block at the end.
+
+    The identity message never changes for an agent, so the prompt prefix
+    stays byte-identical across turns and the provider-side prompt cache
+    keeps hitting; the volatile data block is rewritten only when the
+    rendered summary actually changed.
+    """
+    identity = f"Eres el agente {agent_name}."
+    first = chat_ctx.items[0] if chat_ctx.items else None
+    if not (
+        first is not None
+        and first.type == "message"
+        and first.role == "system"
+        and first.text_content == identity
+    ):
+        msg = chat_ctx.add_message(role="system", content=identity)
+        chat_ctx.items.remove(msg)
+        chat_ctx.items.insert(0, msg)
+        existing_ids.add(msg.id)
+
+    data_block = f"Datos: {summary}"
+    volatile = [item for item in chat_ctx.items if _is_volatile_system_message(item)]
+    if not (volatile and volatile[-1].text_content == data_block):
+        for item in volatile:
+            chat_ctx.items.remove(item)
+            existing_ids.discard(item.id)
+        msg = chat_ctx.add_message(role="system", content=data_block)
+        existing_ids.add(msg.id)
+
+
 class BaseAgent(Agent):
     async def on_enter(self) -> None:
         agent_name = self.__class__.__name__
-        logger.info(f"entering task {agent_name}")
+        logger.info("entering task %s", agent_name)
 
         userdata: UserData = self.session.userdata
+        # Agent.chat_ctx is read-only (its item list raises on mutation);
+        # copy() is shallow — a new list over shared ChatItem references —
+        # and gives us the mutable context that update_chat_ctx expects
         chat_ctx = self.chat_ctx.copy()
+        # built once per entry; every mutation below keeps it in sync so
+        # dedup and eviction stay one hash operation per item
+        existing_ids = {item.id for item in chat_ctx.items}
 
         # add the previous agent's chat history to the current agent
         if userdata.prev_agent:
-            items_copy = self._truncate_chat_ctx(
-                userdata.prev_agent.chat_ctx.items, keep_function_call=True
-            )
-            existing_ids = {item.id for item in chat_ctx.items}
-            items_copy = [item for item in items_copy if item.id not in existing_ids]
-            chat_ctx.items.extend(items_copy)
-
-        # add an instructions including the user data as a system message
-        chat_ctx.add_message(
-            role="system",
-            content=f"Eres el agente {agent_name}. Los datos actuales del usuario son {userdata.summarize()}",
-        )
+            # the transfer already truncated the history into a shared tuple;
+            # items are merged by reference, never copied per handoff
+            items_copy = userdata.handoff_items
+            if items_copy is None:
+                items_copy = tuple(
+                    self._truncate_chat_ctx(
+                        userdata.prev_agent.chat_ctx.items, keep_function_call=True
+                    )
+                )
+            for item in items_copy:
+                if item.id not in existing_ids:
+                    chat_ctx.items.append(item)
+                    existing_ids.add(item.id)
+            userdata.handoff_items = None
+            # the merge is done: drop the reference so the old agent's full
+            # chat history isn't pinned in memory for the rest of the session
+            userdata.prev_agent = None
+
+        _apply_prompt_blocks(chat_ctx, agent_name, userdata.summarize(), existing_ids)
         await self.update_chat_ctx(chat_ctx)
+        # generate_reply returns a SpeechHandle and runs the turn internally
+        # (no dangling coroutine); it must not start before the ctx update
+        # above lands, and awaiting the handle would stall agent entry until
+        # playout finishes
         self.session.generate_reply(tool_choice="none")
 
     async def _transfer_to_agent(self, name: str, context: RunContext_T) -> tuple[Agent, str]:
@@ -86,6 +245,9 @@ class BaseAgent(Agent):
         current_agent = context.session.current_agent
         next_agent = userdata.agents[name]
         userdata.prev_agent = current_agent
+        userdata.handoff_items = tuple(
+            self._truncate_chat_ctx(current_agent.chat_ctx.items, keep_function_call=True)
+        )
 
         return next_agent, f"Transferring to {name}."
 
@@ -98,53 +260,35 @@ class BaseAgent(Agent):
     ) -> list[llm.ChatItem]:
         """Truncate the chat context to keep the last n messages."""
 
-        def _valid_item(item: llm.ChatItem) -> bool:
-            if not keep_system_message and item.type == "message" and item.role == "system":
-                return False
-            if not keep_function_call and item.type in [
-                "function_call",
-                "function_call_output",
-            ]:
-                return False
-            return True
-
-        new_items: list[llm.ChatItem] = []
+        _valid_item = _VALID_ITEM[(keep_system_message, keep_function_call)]
+
+        # walk backwards and stop at N kept items, so a long history is never
+        # filtered (or reversed) in full
+        new_items: deque[llm.ChatItem] = deque(maxlen=keep_last_n_messages)
         for item in reversed(items):
             if _valid_item(item):
-                new_items.append(item)
-            if len(new_items) >= keep_last_n_messages:
-                break
-        new_items = new_items[::-1]
+                new_items.appendleft(item)
+                if len(new_items) == keep_last_n_messages:
+                    break
 
         # the truncated items should not start with function_call or function_call_output
-        while new_items and new_items[0].type in ["function_call", "function_call_output"]:
-            new_items.pop(0)
+        while new_items and new_items[0].type in _FC_TYPES:
+            new_items.popleft()
 
-        return new_items
+        return list(new_items)
 
 
 class Greeter(BaseAgent):
-    def __init__(self, menu: str) -> None:
+    def __init__(self) -> None:
         super().__init__(
             instructions=(
-            f"Eres un amable recepcionista de restaurante. El menú es: {menu}\n"
+            "Eres un amable recepcionista de restaurante. Consulta el menú en los datos del usuario.\n"
             "Tu trabajo es saludar a quien llama y entender si quieren "
             "hacer una reserva o pedir comida para llevar. Guíalos al agente adecuado usando las herramientas."
             ),
-            llm=openai.LLM(model="gpt-4o-mini", parallel_tool_calls=False),
-            tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-            id=os.getenv("ELEVEN_VOICE_ID"),
-            name="Carolina",
-            category="premade",
-            settings=elevenlabs.tts.VoiceSettings(
-                stability=0.71,
-                similarity_boost=0.5,
-                style=0.0,
-                use_speaker_boost=True
-            )
-        )),
+            llm=_llm(),
+            tts=_make_tts(),
         )
-        self.menu = menu
 
     @function_tool()
     async def to_reservation(self, context: RunContext_T) -> Agent:
@@ -168,18 +312,8 @@ class Reservation(BaseAgent):
             instructions="Eres un agente de reservas en un restaurante. Tu trabajo es preguntar por "
             "la hora de la reserva, luego el nombre del cliente, y el número de teléfono. Después "
             "confirma los detalles de la reserva con el cliente.",
-            tools=[update_name, update_phone, to_greeter],
-            tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-            id=os.getenv("ELEVEN_VOICE_ID"),
-            name="Carolina",
-            category="premade",
-            settings=elevenlabs.tts.VoiceSettings(
-                stability=0.71,
-                similarity_boost=0.5,
-                style=0.0,
-                use_speaker_boost=True
-            )
-        )),
+            tools=_CONTACT_TOOLS,
+            tts=_make_tts(),
         )
 
     @function_tool()
@@ -190,6 +324,7 @@ class Reservation(BaseAgent):
     ) -> str:
         userdata = context.userdata
         userdata.reservation_time = time
+        userdata.touch()
         return f"The reservation time is updated to {time}"
 
     @function_tool()
@@ -205,25 +340,15 @@ class Reservation(BaseAgent):
 
 
 class Takeaway(BaseAgent):
-    def __init__(self, menu: str) -> None:
+    def __init__(self) -> None:
         super().__init__(
             instructions=(
-            f"Eres un agente de comida para llevar que toma pedidos de los clientes. "
-            f"Nuestro menú es: {menu}\n"
+            "Eres un agente de comida para llevar que toma pedidos de los clientes. "
+            "Consulta el menú en los datos del usuario.\n"
             "Aclara peticiones especiales y confirma el pedido con el cliente."
             ),
             tools=[to_greeter],
-            tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-            id=os.getenv("ELEVEN_VOICE_ID"),
-            name="Carolina",
-            category="premade",
-            settings=elevenlabs.tts.VoiceSettings(
-                stability=0.71,
-                similarity_boost=0.5,
-                style=0.0,
-                use_speaker_boost=True
-            )
-        )),
+            tts=_make_tts(),
         )
 
     @function_tool()
@@ -234,6 +359,7 @@ class Takeaway(BaseAgent):
     ) -> str:
         userdata = context.userdata
         userdata.order = items
+        userdata.touch()
         return f"The order is updated to {items}"
 
     @function_tool()
@@ -246,26 +372,16 @@ class Takeaway(BaseAgent):
 
 
 class Checkout(BaseAgent):
-    def __init__(self, menu: str) -> None:
+    def __init__(self) -> None:
         super().__init__(
             instructions=(
-            f"Eres un agente para realizar pagos en un restaurante. El menú es: {menu}\n"
+            "Eres un agente para realizar pagos en un restaurante. Consulta el menú en los datos del usuario.\n"
             "Tu responsabilidad es confirmar el coste total del "
             "pedido y luego recopilar el nombre del cliente, número de teléfono e información "
             "de la tarjeta de crédito, incluyendo el número de tarjeta, fecha de caducidad y CVV paso a paso."
             ),
-            tools=[update_name, update_phone, to_greeter],
-            tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-            id=os.getenv("ELEVEN_VOICE_ID"),
-            name="Carolina",
-            category="premade",
-            settings=elevenlabs.tts.VoiceSettings(
-                stability=0.71,
-                similarity_boost=0.5,
-                style=0.0,
-                use_speaker_boost=True
-            )
-            )),
+            tools=_CONTACT_TOOLS,
+            tts=_make_tts(),
         )
 
     @function_tool()
@@ -276,6 +392,7 @@ class Checkout(BaseAgent):
     ) -> str:
         userdata = context.userdata
         userdata.expense = expense
+        userdata.touch()
         return f"The expense is confirmed to be {expense}"
 
     @function_tool()
@@ -290,6 +407,7 @@ class Checkout(BaseAgent):
         userdata.customer_credit_card = number
         userdata.customer_credit_card_expiry = expiry
         userdata.customer_credit_card_cvv = cvv
+        userdata.touch()
         return f"The credit card number is updated to {number}"
 
     @function_tool()
@@ -306,6 +424,7 @@ class Checkout(BaseAgent):
             return "Please provide the credit card information first."
 
         userdata.checked_out = True
+        userdata.touch()
         return await to_greeter(context)
 
     @function_tool()
@@ -313,43 +432,60 @@ class Checkout(BaseAgent):
         return await self._transfer_to_agent("takeaway", context)
 
 
+def _noise_filter():
+    # NOISE_CANCELLATION=bvc|nc|off — skip or lighten the filter on clean
+    # headset deployments where BVC is pure per-frame CPU overhead
+    from livekit.plugins import noise_cancellation
+
+    mode = os.getenv("NOISE_CANCELLATION", "bvc").lower()
+    if mode == "off":
+        return None
+    if mode == "nc":
+        return noise_cancellation.NC()
+    return noise_cancellation.BVC()
+
+
+def prewarm(proc: JobProcess):
+    from livekit.plugins import turn_detector
+
+    proc.userdata["vad"] = load_vad()
+    proc.userdata["eou"] = turn_detector.EOUModel()
+
+
 async def entrypoint(ctx: JobContext):
+    from livekit.plugins import deepgram
+
     await ctx.connect()
 
-    menu = "Pizza: $10, Salad: $5, Ice Cream: $3, Coffee: $2"
-    userdata = UserData()
+    userdata = UserData(menu="Pizza: $10, Salad: $5, Ice Cream: $3, Coffee: $2")
     userdata.agents.update(
         {
-            "greeter": Greeter(menu),
+            "greeter": Greeter(),
             "reservation": Reservation(),
-            "takeaway": Takeaway(menu),
-            "checkout": Checkout(menu),
+            "takeaway": Takeaway(),
+            "checkout": Checkout(),
         }
     )
     agent = AgentSession[UserData](
         userdata=userdata,
-        stt=deepgram.STT(model="nova-3-general", language="es"),
-        llm=openai.LLM(model="gpt-4o-mini"),
-        tts=elevenlabs.TTS(voice=elevenlabs.tts.Voice(
-                id=os.getenv("ELEVEN_VOICE_ID"),
-                name="Carolina",
-                category="premade",
-                settings=elevenlabs.tts.VoiceSettings(
-                    stability=0.71,
-                    similarity_boost=0.5,
-                    style=0.0,
-                    use_speaker_boost=True
-                )
-        )),
-        vad=silero.VAD.load(),
+        stt=deepgram.STT(
+            model="nova-3-general",
+            language="es",
+            smart_format=False,
+        ),
+        llm=_llm(),
+        tts=_make_tts(),
+        vad=ctx.proc.userdata["vad"],
+        turn_detection=ctx.proc.userdata["eou"],
         max_tool_steps=5,
+        preemptive_generation=True,
     )
 
     await agent.start(
         agent=userdata.agents["greeter"],
         room=ctx.room,
         room_input_options=RoomInputOptions(
-        noise_cancellation=noise_cancellation.BVC(),
+        noise_cancellation=_noise_filter(),
         ),
     )
 
@@ -357,4 +493,4 @@ async def entrypoint(ctx: JobContext):
 
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
@@ -15,14 +15,28 @@ browser = Browser(
 agent = Agent(
     task="Entra en linkedin, usa mi cuenta de google para iniciar sesion y haz un post haciendo un post sobre como se puede aplicar los MCP Servers",
     llm=ChatOpenAI(model='gpt-4o'),
+    # the cheap model digests page snapshots so gpt-4o only sees the trimmed
+    # extraction instead of the raw multi-thousand-token DOM dump per step
+    page_extraction_llm=ChatOpenAI(model='gpt-4o-mini'),
+    # hard cap on the history/snapshot tokens forwarded per step
+    max_input_tokens=32000,
     browser=browser,
 )
 
 async def main():
-    await agent.run()
+    try:
+        await agent.run()
 
-    input('Press Enter to close the browser...')
-    await browser.close()
+        # input() would block the whole event loop and stall browser_use's
+        # background tasks (websocket pings, keepalives); run it in a thread
+        await asyncio.to_thread(input, 'Press Enter to close the browser...')
+    finally:
+        # always release the chromium subprocess and the agent's connection
+        # pools, even when the run raises
+        await browser.close()
+        aclose = getattr(agent, 'aclose', None)
+        if aclose is not None:
+            await aclose()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
@@ -3,9 +3,22 @@ from livekit.agents.voice import Agent
 from typing import Optional
 import yaml
 
+try:
+    # the C emitter is an order of magnitude faster than the pure-Python one
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
 
-@dataclass
+# single shared instance for every unset field in the summary
+_UNKNOWN = "desconocido"
+
+
+@dataclass(slots=True)
 class UserData:
+    # shared by every agent through summarize() so the menu tokens are sent
+    # once per prompt instead of once per agent instruction block
+    menu: str = ""
+
     customer_name: Optional[str] = None
     customer_phone: Optional[str] = None
 
@@ -22,22 +35,39 @@ class UserData:
 
     agents: dict[str, Agent] = field(default_factory=dict)
     prev_agent: Optional[Agent] = None
+    # truncated history shared by reference at handoff; immutable so agents
+    # can merge it without copying the ChatItem objects
+    handoff_items: Optional[tuple] = None
+
+    _rev: int = field(default=0, repr=False)
+    _summary_cache: Optional[tuple[int, str]] = field(default=None, repr=False)
+
+    def touch(self) -> None:
+        """Mark the data as modified so the next summarize() re-renders."""
+        self._rev += 1
 
     def summarize(self) -> str:
+        # summarize() runs on every agent handoff but the fields only change
+        # on tool calls, so cache the rendered string per revision
+        if self._summary_cache is not None and self._summary_cache[0] == self._rev:
+            return self._summary_cache[1]
         data = {
-            "nombre_cliente": self.customer_name or "desconocido",
-            "telefono_cliente": self.customer_phone or "desconocido",
-            "hora_reserva": self.reservation_time or "desconocido",
-            "pedido": self.order or "desconocido",
+            "menu": self.menu or _UNKNOWN,
+            "nombre_cliente": self.customer_name or _UNKNOWN,
+            "telefono_cliente": self.customer_phone or _UNKNOWN,
+            "hora_reserva": self.reservation_time or _UNKNOWN,
+            "pedido": self.order or _UNKNOWN,
             "tarjeta_credito": {
-            "numero": self.customer_credit_card or "desconocido",
-            "caducidad": self.customer_credit_card_expiry or "desconocido",
-            "cvv": self.customer_credit_card_cvv or "desconocido",
+            "numero": self.customer_credit_card or _UNKNOWN,
+            "caducidad": self.customer_credit_card_expiry or _UNKNOWN,
+            "cvv": self.customer_credit_card_cvv or _UNKNOWN,
             }
             if self.customer_credit_card
             else None,
-            "importe": self.expense or "desconocido",
+            "importe": self.expense or _UNKNOWN,
             "pagado": self.checked_out or False,
         }
-        # summarize in yaml performs better than json
-        return yaml.dump(data)
+        # summarize in yaml performs better than json (LLM quality, not speed)
+        rendered = yaml.dump(data, Dumper=_YamlDumper)
+        self._summary_cache = (self._rev, rendered)
+        return rendered